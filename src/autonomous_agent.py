@@ -5,47 +5,116 @@ Continuously monitors for tasks and executes them using Gemini AI
 """
 
 import asyncio
-import json
+import os
 import signal
-from datetime import datetime
+from collections import deque
+from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 
+import fastjsonschema
+import orjson
 import structlog
-from watchdog.events import FileSystemEventHandler
-from watchdog.observers import Observer
+from inotify_simple import INotify
+from inotify_simple import flags as inotify_flags
 
-from config_manager import ConfigManager
-from gemini_client import GeminiClient
+from config_manager import get_config_manager
+from gemini_client import get_client
 from task_processor import TaskProcessor
 
 # Initialize structured logging
 logger = structlog.get_logger()
 
+# Schema every task file must satisfy; compiled once into a validator
+TASK_SCHEMA = {
+    "type": "object",
+    "required": ["id", "task", "type"],
+    "properties": {
+        "id": {"type": ["string", "integer"]},
+        "task": {"type": "string"},
+        "type": {"type": "string"},
+    },
+}
+_validate_task = fastjsonschema.compile(TASK_SCHEMA)
+
+
+def _task_schema_error(task_data: Any) -> Optional[str]:
+    """Return why task data violates the task schema, or None if it is valid"""
+    try:
+        _validate_task(task_data)
+        return None
+    except fastjsonschema.JsonSchemaException as e:
+        return e.message
+
+
+# Number of queued task files read per worker thread round-trip
+TASK_READ_BATCH_SIZE = 128
 
-class TaskFileHandler(FileSystemEventHandler):
-    """Handles new task files in the input directory"""
+# Maximum number of task results written per worker thread round-trip
+RESULT_WRITE_BATCH_SIZE = 32
+
+
+def _scan_task_files(input_dir: str) -> List[str]:
+    """List task files in the input directory using cached dirent types"""
+    with os.scandir(input_dir) as entries:
+        return sorted(
+            entry.path
+            for entry in entries
+            if entry.name.endswith(".json") and entry.is_file()
+        )
 
-    def __init__(self, agent):
-        self.agent = agent
-        super().__init__()
 
-    def on_created(self, event):
-        if not event.is_directory and event.src_path.endswith(".json"):
-            self.agent.schedule_task_processing(event.src_path)
+def _read_task_files(file_paths: List[str]) -> List[Tuple[str, Dict[str, Any]]]:
+    """Read and parse a batch of task files, skipping unreadable ones"""
+    tasks = []
+    for file_path in file_paths:
+        try:
+            with open(file_path, "rb") as f:
+                tasks.append((file_path, orjson.loads(f.read())))
+        except Exception as e:
+            logger.error("Error reading task file", file_path=file_path, error=str(e))
+    return tasks
+
+
+def _write_result_files(results: List[Tuple[Path, bytes, Path]], processed_dir: Path):
+    """Write a batch of serialised task results and archive their task files"""
+    for output_file, payload, task_file in results:
+        try:
+            # Write beside the destination and rename, so readers never see
+            # a partial result (the output dir may be a separate mount)
+            temp_file = output_file.with_name(f".{output_file.name}.tmp")
+            temp_file.write_bytes(payload)
+            os.replace(temp_file, output_file)
+            task_file.rename(processed_dir / task_file.name)
+            logger.info("Task result saved", output_file=str(output_file))
+        except Exception as e:
+            logger.error(
+                "Error saving task result", output_file=str(output_file), error=str(e)
+            )
 
 
 class AutonomousAgent:
     """Main autonomous agent class"""
 
     def __init__(self):
-        self.config = ConfigManager()
-        self.gemini_client = GeminiClient()
+        self.config = get_config_manager()
+        self.gemini_client = get_client()
         self.task_processor = TaskProcessor(self.gemini_client)
-        self.running = False
-        self.observer = None
+        self.inotify = None
         self.loop = None  # Store reference to main event loop
-        self.pending_tasks = []  # Queue for tasks from file watcher
+        self.shutdown_event = asyncio.Event()
+        self.health_task = None
+
+        # Bounded task queue drained by a fixed pool of workers
+        max_concurrent_tasks = self.config.get("max_concurrent_tasks", 5)
+        self.task_semaphore = asyncio.Semaphore(max_concurrent_tasks)
+        self.task_queue = asyncio.Queue(maxsize=2 * max_concurrent_tasks)
+        self.pending_tasks = deque()  # Task files reported by inotify, not yet read
+        self.tasks_pending = asyncio.Event()
+        self.task_reader = None
+        self.workers = []
+        self.result_queue = asyncio.Queue()  # Serialised results awaiting write
+        self.result_writer = None
 
         # Setup signal handlers
         signal.signal(signal.SIGTERM, self._signal_handler)
@@ -54,18 +123,6 @@ class AutonomousAgent:
         # Ensure directories exist
         self._setup_directories()
 
-    def schedule_task_processing(self, file_path: str):
-        """Schedule task processing from file watcher thread"""
-        if self.loop and self.loop.is_running():
-            # Schedule the coroutine in the main event loop
-            asyncio.run_coroutine_threadsafe(
-                self.process_task_file(file_path), self.loop
-            )
-        else:
-            # Fallback: add to pending queue
-            self.pending_tasks.append(file_path)
-            logger.warning("Event loop not available, queued task", file_path=file_path)
-
     def _setup_directories(self):
         """Create necessary directories"""
         directories = [
@@ -82,70 +139,138 @@ class AutonomousAgent:
     def _signal_handler(self, signum, frame):
         """Handle shutdown signals gracefully"""
         logger.info("Received shutdown signal", signal=signum)
-        self.running = False
+        if self.loop:
+            self.loop.call_soon_threadsafe(self.shutdown_event.set)
+        else:
+            self.shutdown_event.set()
 
     async def start(self):
         """Start the autonomous agent"""
         logger.info("Starting Autonomous Agent")
-        self.running = True
         self.loop = asyncio.get_running_loop()  # Store loop reference
 
+        # Start task workers
+        self.workers = [
+            asyncio.create_task(self._task_worker())
+            for _ in range(self.config.get("max_concurrent_tasks", 5))
+        ]
+
+        # Start batched task reader and result writer
+        self.task_reader = asyncio.create_task(self._task_reader())
+        self.result_writer = asyncio.create_task(self._result_writer())
+
+        # Schedule periodic health checks
+        self.health_task = asyncio.create_task(self._health_loop())
+
         # Start file system monitoring
         self._start_file_monitoring()
 
         # Process any existing tasks
         await self._process_existing_tasks()
 
-        # Process any pending tasks from file watcher
-        await self._process_pending_tasks()
-
         # Main event loop
         await self._main_loop()
 
     def _start_file_monitoring(self):
         """Start monitoring the input directory for new task files"""
-        self.observer = Observer()
-        event_handler = TaskFileHandler(self)
-        self.observer.schedule(
-            event_handler, str(Path("/app/data/input")), recursive=False
+        input_dir = str(Path("/app/data/input"))
+
+        # Only react once a task file is complete, not on creation
+        self.inotify = INotify(nonblocking=True)
+        self.inotify.add_watch(
+            input_dir, inotify_flags.CLOSE_WRITE | inotify_flags.MOVED_TO
+        )
+        self.loop.add_reader(
+            self.inotify.fileno(), self._on_inotify, self.inotify, input_dir
         )
-        self.observer.start()
         logger.info("File monitoring started")
 
+    def _on_inotify(self, inotify: INotify, input_dir: str):
+        """Schedule processing for every task file reported by inotify"""
+        for event in inotify.read(timeout=0):
+            if event.mask & inotify_flags.ISDIR or not event.name.endswith(".json"):
+                continue
+
+            self._enqueue_task_file(os.path.join(input_dir, event.name))
+
+    def _enqueue_task_file(self, file_path: str):
+        """Hand a reported task file to the batched task reader"""
+        self.pending_tasks.append(file_path)
+        self.tasks_pending.set()
+
+    async def _task_reader(self):
+        """Read reported task files in batches, one thread hop per batch"""
+        while True:
+            await self.tasks_pending.wait()
+            self.tasks_pending.clear()
+            while self.pending_tasks:
+                batch = [
+                    self.pending_tasks.popleft()
+                    for _ in range(min(TASK_READ_BATCH_SIZE, len(self.pending_tasks)))
+                ]
+                # Waiting for queue space applies backpressure; further
+                # reports accumulate as paths in pending_tasks meanwhile
+                for task in await asyncio.to_thread(_read_task_files, batch):
+                    await self.task_queue.put(task)
+
+    async def _task_worker(self):
+        """Process queued task files one at a time"""
+        while True:
+            file_path, task_data = await self.task_queue.get()
+            try:
+                await self.process_task_file(file_path, task_data)
+            finally:
+                self.task_queue.task_done()
+
     async def _process_existing_tasks(self):
-        """Process any existing task files in the input directory"""
-        input_dir = Path("/app/data/input")
-        for task_file in input_dir.glob("*.json"):
-            await self.process_task_file(str(task_file))
-
-    async def _process_pending_tasks(self):
-        """Process any tasks that were queued before event loop was ready"""
-        while self.pending_tasks:
-            file_path = self.pending_tasks.pop(0)
-            await self.process_task_file(file_path)
-
-    async def process_task_file(self, file_path: str):
-        """Process a single task file"""
+        """Queue any existing task files in the input directory"""
+        async for task in self._scan_and_read_inputs():
+            await self.task_queue.put(task)
+
+    async def _scan_and_read_inputs(
+        self,
+    ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """Yield parsed task files from the input directory, read in batches"""
+        file_paths = await asyncio.to_thread(
+            _scan_task_files, str(Path("/app/data/input"))
+        )
+        for start in range(0, len(file_paths), TASK_READ_BATCH_SIZE):
+            batch = file_paths[start : start + TASK_READ_BATCH_SIZE]
+            for task in await asyncio.to_thread(_read_task_files, batch):
+                yield task
+
+    async def process_task_file(
+        self, file_path: str, task_data: Optional[Dict[str, Any]] = None
+    ):
+        """Process a single task file, reading it unless already parsed"""
+        async with self.task_semaphore:
+            await self._process_task_file(file_path, task_data)
+
+    async def _process_task_file(
+        self, file_path: str, task_data: Optional[Dict[str, Any]]
+    ):
+        """Read, execute and archive a single task file"""
         try:
             logger.info("Processing task file", file_path=file_path)
 
-            with open(file_path, "r") as f:
-                task_data = json.load(f)
+            if task_data is None:
+                loaded = await asyncio.to_thread(_read_task_files, [file_path])
+                if not loaded:
+                    return
+                _, task_data = loaded[0]
 
             # Validate task data
-            if not self._validate_task_data(task_data):
-                logger.error("Invalid task data", file_path=file_path)
+            reason = _task_schema_error(task_data)
+            if reason is not None:
+                logger.error("Invalid task data", file_path=file_path, reason=reason)
                 return
 
             # Execute task
             result = await self.task_processor.execute_task(task_data)
 
-            # Save result
+            # Queue result for writing; the task file is archived once written
             await self._save_task_result(task_data, result, file_path)
 
-            # Move processed file
-            self._move_processed_file(file_path)
-
             logger.info(
                 "Task completed successfully", task_id=task_data.get("id", "unknown")
             )
@@ -155,11 +280,6 @@ class AutonomousAgent:
                 "Error processing task file", file_path=file_path, error=str(e)
             )
 
-    def _validate_task_data(self, task_data: Dict[str, Any]) -> bool:
-        """Validate task data structure"""
-        required_fields = ["id", "task", "type"]
-        return all(field in task_data for field in required_fields)
-
     async def _save_task_result(
         self, task_data: Dict[str, Any], result: Dict[str, Any], original_file: str
     ):
@@ -170,43 +290,47 @@ class AutonomousAgent:
             "task_id": task_data["id"],
             "original_task": task_data,
             "result": result,
-            "timestamp": datetime.utcnow().isoformat(),
+            "timestamp": datetime.now(timezone.utc),
             "status": "completed" if result.get("success") else "failed",
         }
 
-        with open(output_file, "w") as f:
-            json.dump(result_data, f, indent=2)
-
-        logger.info("Task result saved", output_file=str(output_file))
+        payload = orjson.dumps(
+            result_data, option=orjson.OPT_INDENT_2 | orjson.OPT_UTC_Z
+        )
+        await self.result_queue.put((output_file, payload, Path(original_file)))
+
+    async def _result_writer(self):
+        """Write queued task results, coalescing bursts into one thread hop"""
+        while True:
+            batch = [await self.result_queue.get()]
+            while len(batch) < RESULT_WRITE_BATCH_SIZE:
+                try:
+                    batch.append(self.result_queue.get_nowait())
+                except asyncio.QueueEmpty:
+                    break
 
-    def _move_processed_file(self, file_path: str):
-        """Move processed file to processed directory"""
-        source = Path(file_path)
-        destination = Path("/app/data/processed") / source.name
-        source.rename(destination)
+            try:
+                await asyncio.to_thread(
+                    _write_result_files, batch, Path("/app/data/processed")
+                )
+            finally:
+                for _ in batch:
+                    self.result_queue.task_done()
 
     async def _main_loop(self):
-        """Main event loop"""
+        """Main event loop, idle until a shutdown is requested"""
         logger.info("Agent main loop started")
-        health_check_counter = 0
-
-        while self.running:
-            try:
-                # Perform health check less frequently (every 30 seconds)
-                health_check_counter += 1
-                if health_check_counter >= 6:  # 6 * 5 seconds = 30 seconds
-                    await self._health_check()
-                    health_check_counter = 0
-
-                # Process any pending tasks
-                await self._process_pending_tasks()
+        await self.shutdown_event.wait()
 
-                # Sleep for a short interval
-                await asyncio.sleep(5)
+    async def _health_loop(self):
+        """Run health checks every health_check_interval seconds"""
+        interval = self.config.get("health_check_interval", 30)
 
-            except Exception as e:
-                logger.error("Error in main loop", error=str(e))
-                await asyncio.sleep(10)
+        while not self.shutdown_event.is_set():
+            try:
+                await asyncio.wait_for(self.shutdown_event.wait(), timeout=interval)
+            except asyncio.TimeoutError:
+                await self._health_check()
 
     async def _health_check(self):
         """Perform health checks"""
@@ -216,11 +340,10 @@ class AutonomousAgent:
                 logger.warning("Gemini API health check failed")
 
             # Check disk space
-            import psutil
-
-            disk_usage = psutil.disk_usage("/app/data")
-            if disk_usage.percent > 90:
-                logger.warning("Low disk space", usage_percent=disk_usage.percent)
+            stat = os.statvfs("/app/data")
+            usage_percent = 100.0 * (1 - stat.f_bavail / stat.f_blocks)
+            if usage_percent > 90:
+                logger.warning("Low disk space", usage_percent=round(usage_percent, 1))
 
         except Exception as e:
             logger.error("Health check failed", error=str(e))
@@ -228,11 +351,25 @@ class AutonomousAgent:
     async def shutdown(self):
         """Graceful shutdown"""
         logger.info("Shutting down agent")
-        self.running = False
+        self.shutdown_event.set()
+
+        if self.health_task:
+            self.health_task.cancel()
+
+        if self.inotify:
+            self.loop.remove_reader(self.inotify.fileno())
+            self.inotify.close()
+
+        if self.task_reader:
+            self.task_reader.cancel()
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
 
-        if self.observer:
-            self.observer.stop()
-            self.observer.join()
+        # Flush results that are still waiting to be written
+        if self.result_writer:
+            await self.result_queue.join()
+            self.result_writer.cancel()
 
         await self.gemini_client.close()
         logger.info("Agent shutdown complete")
@@ -5,6 +5,7 @@ Handles configuration loading and management
 """
 
 import os
+from functools import lru_cache
 from pathlib import Path
 from typing import Any, Dict, Optional
 
@@ -12,18 +13,54 @@ import structlog
 import yaml
 from pydantic import BaseModel, Field
 
+try:
+    from yaml import CSafeLoader as YamlLoader
+except ImportError:  # PyYAML built without libyaml
+    from yaml import SafeLoader as YamlLoader
+
 logger = structlog.get_logger()
 
 
+def _parse_bool(value: str) -> bool:
+    """Interpret common truthy spellings of an environment variable"""
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+# Environment variable overrides: (variable, config field, type converter)
+_ENV_MAP = (
+    ("GEMINI_API_KEY", "gemini_api_key", str),
+    ("GEMINI_MODEL", "gemini_model", str),
+    ("GEMINI_TEMPERATURE", "gemini_temperature", float),
+    ("GEMINI_TOP_P", "gemini_top_p", float),
+    ("GEMINI_TOP_K", "gemini_top_k", int),
+    ("GEMINI_MAX_TOKENS", "gemini_max_tokens", int),
+    ("GEMINI_CACHE_MAX", "gemini_cache_max", int),
+    ("GEMINI_CACHE_TTL", "gemini_cache_ttl", float),
+    ("GEMINI_SEMANTIC_CACHE", "gemini_semantic_cache", _parse_bool),
+    ("GEMINI_SEMANTIC_CACHE_THRESHOLD", "gemini_semantic_cache_threshold", float),
+    ("LOG_LEVEL", "log_level", str),
+    ("HEALTH_CHECK_INTERVAL", "health_check_interval", int),
+    ("HEALTHCHECK_DEEP", "healthcheck_deep", _parse_bool),
+    ("MAX_CONCURRENT_TASKS", "max_concurrent_tasks", int),
+)
+
+
 class AgentConfig(BaseModel):
     """Agent configuration model"""
 
     gemini_api_key: str = Field(..., min_length=1)
     gemini_model: str = Field(default="gemini-2.0-flash-lite")
     gemini_temperature: float = Field(default=0.7, ge=0.0, le=1.0)
+    gemini_top_p: float = Field(default=0.8, ge=0.0, le=1.0)
+    gemini_top_k: int = Field(default=40, gt=0)
     gemini_max_tokens: int = Field(default=2048, gt=0)
+    gemini_cache_max: int = Field(default=256, ge=0)
+    gemini_cache_ttl: float = Field(default=3600.0, gt=0.0)
+    gemini_semantic_cache: bool = Field(default=False)
+    gemini_semantic_cache_threshold: float = Field(default=0.92, gt=0.0, le=1.0)
     log_level: str = Field(default="INFO")
     health_check_interval: int = Field(default=30)
+    healthcheck_deep: bool = Field(default=False)
     max_concurrent_tasks: int = Field(default=5)
 
 
@@ -42,40 +79,16 @@ class ConfigManager:
         if Path(self.config_file).exists():
             try:
                 with open(self.config_file, "r") as f:
-                    file_config = yaml.safe_load(f) or {}
+                    file_config = yaml.load(f, Loader=YamlLoader) or {}
                 config_data.update(file_config)
             except Exception as e:
                 logger.warning("Failed to load config file", error=str(e))
 
         # Override with environment variables
-        env_mapping = {
-            "GEMINI_API_KEY": "gemini_api_key",
-            "GEMINI_MODEL": "gemini_model",
-            "GEMINI_TEMPERATURE": "gemini_temperature",
-            "GEMINI_MAX_TOKENS": "gemini_max_tokens",
-            "LOG_LEVEL": "log_level",
-            "HEALTH_CHECK_INTERVAL": "health_check_interval",
-            "MAX_CONCURRENT_TASKS": "max_concurrent_tasks",
-        }
-
-        for env_var, config_key in env_mapping.items():
-            value = os.getenv(env_var)
+        for env_var, config_key, convert in _ENV_MAP:
+            value = os.environ.get(env_var)
             if value:
-                # Convert types as needed
-                if config_key in ["gemini_temperature"]:
-                    value = float(value)
-                elif config_key in [
-                    "gemini_max_tokens",
-                    "health_check_interval",
-                    "max_concurrent_tasks",
-                ]:
-                    value = int(value)
-
-                config_data[config_key] = value
-
-        # Ensure required fields have defaults
-        if "gemini_api_key" not in config_data:
-            config_data["gemini_api_key"] = os.getenv("GEMINI_API_KEY", "")
+                config_data[config_key] = convert(value)
 
         return AgentConfig(**config_data)
 
@@ -91,3 +104,14 @@ class ConfigManager:
         """Reload configuration"""
         self.config = self._load_config()
         logger.info("Configuration reloaded")
+
+
+@lru_cache(maxsize=1)
+def get_config_manager() -> ConfigManager:
+    """Get the process-wide configuration manager"""
+    return ConfigManager()
+
+
+def get_config() -> AgentConfig:
+    """Get the current process-wide agent configuration"""
+    return get_config_manager().config
@@ -10,20 +10,30 @@ from pathlib import Path
 
 import structlog
 
-from config_manager import ConfigManager
-from gemini_client import GeminiClient
+from config_manager import get_config_manager
+from gemini_client import get_client
 
 # Add src to path for imports
 sys.path.append(str(Path(__file__).parent))
 
 logger = structlog.get_logger()
 
+_REQUIRED_DIRS = tuple(
+    Path(p)
+    for p in (
+        "/app/data/input",
+        "/app/data/output",
+        "/app/data/processed",
+        "/app/logs",
+    )
+)
+
 
 async def check_gemini_api():
     """Check Gemini API connectivity"""
     try:
-        client = GeminiClient()
-        return await client.health_check()
+        deep = get_config_manager().get("healthcheck_deep", False)
+        return await get_client().health_check(deep=deep)
     except Exception as e:
         logger.error("Gemini API check failed", error=str(e))
         return False
@@ -31,17 +41,10 @@ async def check_gemini_api():
 
 def check_directories():
     """Check required directories exist"""
-    required_dirs = [
-        "/app/data/input",
-        "/app/data/output",
-        "/app/data/processed",
-        "/app/logs",
-    ]
-
-    for directory in required_dirs:
-        if not Path(directory).exists():
-            logger.error("Required directory missing", directory=directory)
-            return False
+    missing = [str(d) for d in _REQUIRED_DIRS if not d.is_dir()]
+    if missing:
+        logger.error("Required directories missing", directories=missing)
+        return False
 
     return True
 
@@ -49,7 +52,7 @@ def check_directories():
 def check_environment():
     """Check required environment variables"""
     try:
-        config = ConfigManager()
+        config = get_config_manager()
         return bool(config.get("gemini_api_key"))
     except Exception as e:
         logger.error("Environment check failed", error=str(e))
@@ -58,10 +61,15 @@ def check_environment():
 
 async def main():
     """Main health check function"""
+    directories, environment, gemini_api = await asyncio.gather(
+        asyncio.to_thread(check_directories),
+        asyncio.to_thread(check_environment),
+        check_gemini_api(),
+    )
     checks = {
-        "directories": check_directories(),
-        "environment": check_environment(),
-        "gemini_api": await check_gemini_api(),
+        "directories": directories,
+        "environment": environment,
+        "gemini_api": gemini_api,
     }
 
     all_passed = all(checks.values())
@@ -4,17 +4,26 @@ Task Processor for Gemini Autonomous Agent
 Handles task execution and processing logic
 """
 
-from pathlib import Path
-from typing import Any, Dict
+import asyncio
+import os
+from typing import Any, Dict, List
 
 import structlog
 
 logger = structlog.get_logger()
 
 
+def _list_data_files(data_dir: str) -> List[str]:
+    """List names of regular files in a directory, sorted for stable prompts"""
+    with os.scandir(data_dir) as entries:
+        return sorted(entry.name for entry in entries if entry.is_file())
+
+
 class TaskProcessor:
     """Processes tasks using Gemini AI"""
 
+    __slots__ = ("gemini_client", "task_handlers", "_default_handler")
+
     def __init__(self, gemini_client):
         self.gemini_client = gemini_client
         self.task_handlers = {
@@ -23,6 +32,7 @@ class TaskProcessor:
             "file_analysis": self._handle_file_analysis_task,
             "general": self._handle_general_task,
         }
+        self._default_handler = self._handle_general_task
 
     async def execute_task(self, task_data: Dict[str, Any]) -> Dict[str, Any]:
         """Execute a task based on its type"""
@@ -33,7 +43,7 @@ class TaskProcessor:
             logger.info("Executing task", task_id=task_id, task_type=task_type)
 
             # Get appropriate handler
-            handler = self.task_handlers.get(task_type, self._handle_general_task)
+            handler = self.task_handlers.get(task_type) or self._default_handler
 
             # Execute task
             result = await handler(task_data)
@@ -68,8 +78,7 @@ class TaskProcessor:
     ) -> Dict[str, Any]:
         """Handle data processing tasks"""
         # Get available data files
-        data_files = list(Path("/app/data/input").glob("*"))
-        file_names = [f.name for f in data_files if f.is_file()]
+        file_names = await asyncio.to_thread(_list_data_files, "/app/data/input")
 
         return await self.gemini_client.process_data_task(task_data["task"], file_names)
 
@@ -0,0 +1,80 @@
+import sys
+from pathlib import Path
+
+import orjson
+import pytest
+
+# Add src to path
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+
+from autonomous_agent import (
+    _read_task_files,
+    _scan_task_files,
+    _task_schema_error,
+    _write_result_files,
+)
+
+
+@pytest.mark.parametrize(
+    "task_data",
+    [
+        {"id": "task-1", "task": "Summarise", "type": "general"},
+        {"id": 7, "task": "Summarise", "type": "analysis", "priority": "high"},
+    ],
+)
+def test_task_schema_accepts_valid_tasks(task_data):
+    assert _task_schema_error(task_data) is None
+
+
+@pytest.mark.parametrize(
+    "task_data",
+    [
+        {"task": "Summarise", "type": "general"},
+        {"id": 1.5, "task": "Summarise", "type": "general"},
+        {"id": None, "task": "Summarise", "type": "general"},
+        {"id": 1, "task": ["Summarise"], "type": "general"},
+        {"id": 1, "task": "Summarise", "type": 3},
+        ["not", "an", "object"],
+    ],
+)
+def test_task_schema_rejects_invalid_tasks(task_data):
+    assert _task_schema_error(task_data)
+
+
+def test_scan_task_files_lists_sorted_json_files(tmp_path):
+    (tmp_path / "b.json").write_text("{}")
+    (tmp_path / "a.json").write_text("{}")
+    (tmp_path / "notes.txt").write_text("")
+    (tmp_path / "dir.json").mkdir()
+    assert _scan_task_files(str(tmp_path)) == [
+        str(tmp_path / "a.json"),
+        str(tmp_path / "b.json"),
+    ]
+
+
+def test_read_task_files_skips_unreadable_files(tmp_path):
+    good = tmp_path / "good.json"
+    good.write_text('{"id": 1, "task": "Test", "type": "general"}')
+    bad = tmp_path / "bad.json"
+    bad.write_text("{not json")
+    tasks = _read_task_files([str(bad), str(good)])
+    assert tasks == [(str(good), {"id": 1, "task": "Test", "type": "general"})]
+
+
+def test_write_result_files_writes_and_archives(tmp_path):
+    output_dir = tmp_path / "output"
+    processed_dir = tmp_path / "processed"
+    output_dir.mkdir()
+    processed_dir.mkdir()
+    task_file = tmp_path / "task.json"
+    task_file.write_text("{}")
+    output_file = output_dir / "1_result.json"
+
+    _write_result_files(
+        [(output_file, orjson.dumps({"task_id": 1}), task_file)], processed_dir
+    )
+
+    assert orjson.loads(output_file.read_bytes()) == {"task_id": 1}
+    assert [p.name for p in output_dir.iterdir()] == ["1_result.json"]
+    assert not task_file.exists()
+    assert (processed_dir / "task.json").exists()
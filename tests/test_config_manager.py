@@ -0,0 +1,51 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add src to path
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+
+from config_manager import ConfigManager
+
+
+@pytest.fixture
+def load_config(tmp_path):
+    def load():
+        return ConfigManager(str(tmp_path / "missing.yaml")).config
+
+    return load
+
+
+def test_env_overrides_are_converted(monkeypatch, load_config):
+    monkeypatch.setenv("GEMINI_API_KEY", "env_key")
+    monkeypatch.setenv("GEMINI_MODEL", "gemini-test")
+    monkeypatch.setenv("GEMINI_TEMPERATURE", "0.25")
+    monkeypatch.setenv("GEMINI_TOP_K", "12")
+    monkeypatch.setenv("GEMINI_CACHE_TTL", "90.5")
+    monkeypatch.setenv("GEMINI_SEMANTIC_CACHE", "yes")
+    monkeypatch.setenv("HEALTHCHECK_DEEP", "1")
+    monkeypatch.setenv("MAX_CONCURRENT_TASKS", "8")
+
+    config = load_config()
+
+    assert config.gemini_api_key == "env_key"
+    assert config.gemini_model == "gemini-test"
+    assert config.gemini_temperature == 0.25
+    assert config.gemini_top_k == 12
+    assert config.gemini_cache_ttl == 90.5
+    assert config.gemini_semantic_cache is True
+    assert config.healthcheck_deep is True
+    assert config.max_concurrent_tasks == 8
+
+
+@pytest.mark.parametrize("value", ["0", "false", "False", "off"])
+def test_env_bool_flags_can_be_disabled(monkeypatch, load_config, value):
+    monkeypatch.setenv("GEMINI_API_KEY", "env_key")
+    monkeypatch.setenv("GEMINI_SEMANTIC_CACHE", value)
+    monkeypatch.setenv("HEALTHCHECK_DEEP", value)
+
+    config = load_config()
+
+    assert config.gemini_semantic_cache is False
+    assert config.healthcheck_deep is False
@@ -1,13 +1,24 @@
 import pytest
 import asyncio
-from unittest.mock import Mock, patch
+import contextvars
+import time
+from unittest.mock import AsyncMock, Mock, patch
 import sys
 from pathlib import Path
 
 # Add src to path
 sys.path.append(str(Path(__file__).parent.parent / "src"))
 
-from gemini_client import GeminiClient
+from google.api_core import exceptions as google_exceptions
+
+from config_manager import AgentConfig
+from gemini_client import (
+    GeminiClient,
+    LLMCache,
+    SemanticCache,
+    _fast_to_thread,
+    get_client,
+)
 
 
 @pytest.fixture
@@ -19,25 +30,324 @@ def mock_gemini_client():
         return client
 
 
+@pytest.fixture
+def deterministic_gemini_client():
+    config = AgentConfig(gemini_api_key="test", gemini_temperature=0.0)
+    with patch("google.generativeai.configure"), patch(
+        "google.generativeai.GenerativeModel"
+    ):
+        return GeminiClient(config)
+
+
 @pytest.mark.asyncio
 async def test_health_check_success(mock_gemini_client):
-    with patch.object(mock_gemini_client, "generate_response") as mock_generate:
+    with patch.object(mock_gemini_client, "_generate") as mock_generate:
         mock_generate.return_value = {"success": True}
-        result = await mock_gemini_client.health_check()
+        result = await mock_gemini_client.health_check(deep=True)
         assert result is True
 
 
 @pytest.mark.asyncio
 async def test_health_check_failure(mock_gemini_client):
-    with patch.object(mock_gemini_client, "generate_response") as mock_generate:
+    with patch.object(mock_gemini_client, "_generate") as mock_generate:
         mock_generate.side_effect = Exception("API Error")
-        result = await mock_gemini_client.health_check()
+        result = await mock_gemini_client.health_check(deep=True)
         assert result is False
 
 
+@pytest.mark.asyncio
+async def test_deep_health_check_bypasses_cache(deterministic_gemini_client):
+    client = deterministic_gemini_client
+    client.model.generate_content_async = AsyncMock(side_effect=Exception("down"))
+    cache_key = LLMCache.cache_key(client._key_hasher, client._prepare_prompt("Hi"))
+    client.cache.set(cache_key, {"success": True})
+    with patch("gemini_client.asyncio.sleep", AsyncMock()):
+        assert await client.health_check(deep=True) is False
+
+
+@pytest.mark.asyncio
+async def test_health_check_shallow_skips_generation(mock_gemini_client):
+    mock_gemini_client.model.count_tokens_async = AsyncMock()
+    with patch.object(mock_gemini_client, "generate_response") as mock_generate:
+        result = await mock_gemini_client.health_check()
+        assert result is True
+        mock_gemini_client.model.count_tokens_async.assert_awaited_once()
+        mock_generate.assert_not_called()
+
+
 def test_prepare_prompt(mock_gemini_client):
     prompt = "Test task"
     context = {"key": "value"}
     result = mock_gemini_client._prepare_prompt(prompt, context)
     assert "Test task" in result
     assert "key: value" in result
+
+
+def test_prepare_prompt_without_context(mock_gemini_client):
+    result = mock_gemini_client._prepare_prompt("Test task")
+    assert result == "Task: Test task"
+
+
+def test_format_context_is_order_independent(mock_gemini_client):
+    first = mock_gemini_client._format_context({"b": 2, "a": 1})
+    second = mock_gemini_client._format_context({"a": 1, "b": 2})
+    assert first == second == "- a: 1\n- b: 2"
+
+
+def test_format_context_bounds_large_values(mock_gemini_client):
+    context = {"available_files": [f"file_{i}.txt" for i in range(100000)]}
+    result = mock_gemini_client._format_context(context)
+    assert result.startswith("- available_files: ['file_0.txt'")
+    assert "file_10.txt" not in result
+    assert len(result) < 300
+
+
+@pytest.mark.asyncio
+async def test_analyze_file_reads_prefix_only(mock_gemini_client, tmp_path):
+    data_file = tmp_path / "data.txt"
+    data_file.write_text("a" * 5000 + "b" * 5000)
+    with patch.object(mock_gemini_client, "generate_response") as mock_generate:
+        mock_generate.return_value = {"success": True}
+        await mock_gemini_client.analyze_file(str(data_file))
+        prompt, context = mock_generate.call_args.args
+        assert "a" * 2000 in prompt
+        assert "a" * 2001 not in prompt
+        assert context["content_length"] == 10000
+
+
+@pytest.mark.asyncio
+async def test_health_check_reuses_recent_success(mock_gemini_client):
+    mock_gemini_client._last_success = time.monotonic()
+    with patch.object(mock_gemini_client, "generate_response") as mock_generate:
+        result = await mock_gemini_client.health_check()
+        assert result is True
+        mock_generate.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_generate_response_uses_async_api(mock_gemini_client):
+    response = Mock(text="Done", candidates=[])
+    mock_gemini_client.model.generate_content_async = AsyncMock(return_value=response)
+    result = await mock_gemini_client.generate_response("Test task")
+    assert result["success"] is True
+    assert result["response"] == "Done"
+    mock_gemini_client.model.generate_content_async.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_generate_response_retries_transient_errors(mock_gemini_client):
+    response = Mock(text="OK", candidates=[])
+    mock_gemini_client.model.generate_content_async = AsyncMock(
+        side_effect=[google_exceptions.ServiceUnavailable("unavailable"), response]
+    )
+    with patch("gemini_client.asyncio.sleep", AsyncMock()) as mock_sleep:
+        result = await mock_gemini_client.generate_response("Hi")
+    assert result["success"] is True
+    assert mock_gemini_client.model.generate_content_async.await_count == 2
+    mock_sleep.assert_awaited_once_with(4)
+
+
+@pytest.mark.asyncio
+async def test_generate_response_gives_up_after_max_attempts(mock_gemini_client):
+    mock_gemini_client.model.generate_content_async = AsyncMock(
+        side_effect=google_exceptions.ServiceUnavailable("unavailable")
+    )
+    with patch("gemini_client.asyncio.sleep", AsyncMock()):
+        result = await mock_gemini_client.generate_response("Hi")
+    assert result["success"] is False
+    assert "unavailable" in result["error"]
+    assert mock_gemini_client.model.generate_content_async.await_count == 3
+
+
+@pytest.mark.asyncio
+async def test_generate_response_does_not_retry_permanent_errors(mock_gemini_client):
+    mock_gemini_client.model.generate_content_async = AsyncMock(
+        side_effect=google_exceptions.PermissionDenied("bad key")
+    )
+    with patch("gemini_client.asyncio.sleep", AsyncMock()) as mock_sleep:
+        result = await mock_gemini_client.generate_response("Hi")
+    assert result["success"] is False
+    mock_gemini_client.model.generate_content_async.assert_awaited_once()
+    mock_sleep.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_generate_response_stream_yields_chunks(mock_gemini_client):
+    async def chunks():
+        for text in ("Hel", "lo"):
+            yield Mock(text=text)
+
+    mock_gemini_client.model.generate_content_async = AsyncMock(return_value=chunks())
+    parts = [part async for part in mock_gemini_client.generate_response_stream("Hi")]
+    assert parts == ["Hel", "lo"]
+    assert mock_gemini_client.model.generate_content_async.call_args.kwargs["stream"]
+
+
+@pytest.mark.asyncio
+async def test_close_shuts_down_async_channel(mock_gemini_client):
+    async_client = Mock()
+    async_client.transport.close = AsyncMock()
+    mock_gemini_client.model._async_client = async_client
+    await mock_gemini_client.close()
+    async_client.transport.close.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_generate_response_skips_safety_ratings_on_stop(mock_gemini_client):
+    candidate = Mock()
+    candidate.finish_reason.name = "STOP"
+    response = Mock(text="Done", candidates=[candidate])
+    mock_gemini_client.model.generate_content_async = AsyncMock(return_value=response)
+    with patch.object(mock_gemini_client, "_extract_safety_ratings") as mock_extract:
+        result = await mock_gemini_client.generate_response("Test task")
+        mock_extract.assert_not_called()
+    assert result["finish_reason"] == "STOP"
+    assert result["safety_ratings"] == []
+
+
+def test_llm_cache_evicts_least_recently_used():
+    cache = LLMCache(max_size=2, ttl=60)
+    cache.set("a", {"response": "A"})
+    cache.set("b", {"response": "B"})
+    assert cache.get("a") == {"response": "A"}
+    cache.set("c", {"response": "C"})
+    assert cache.get("b") is None
+    assert cache.get("a") == {"response": "A"}
+    assert cache.stats == {"hits": 2, "misses": 1}
+
+
+@pytest.mark.asyncio
+async def test_generate_response_caches_deterministic_calls(
+    deterministic_gemini_client,
+):
+    client = deterministic_gemini_client
+    response = Mock(text="Done", candidates=[])
+    client.model.generate_content_async = AsyncMock(return_value=response)
+    first = await client.generate_response("Test task")
+    second = await client.generate_response("Test task")
+    assert first == second
+    client.model.generate_content_async.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_semantic_cache_matches_similar_prompts():
+    cache = SemanticCache(max_size=2, threshold=0.9, ttl=60)
+    embeddings = {"a": [1.0, 0.0], "a'": [0.99, 0.1], "b": [0.0, 1.0]}
+    with patch(
+        "google.generativeai.embed_content_async",
+        AsyncMock(side_effect=lambda model, content: {"embedding": embeddings[content]}),
+    ):
+        cached, vector = await cache.lookup("a")
+        assert cached is None
+        cache.insert(vector, {"response": "A"})
+        assert (await cache.lookup("a'"))[0] == {"response": "A"}
+        assert (await cache.lookup("b"))[0] is None
+
+
+@pytest.mark.asyncio
+async def test_semantic_cache_entries_expire():
+    cache = SemanticCache(max_size=2, threshold=0.9, ttl=60)
+    embed = AsyncMock(return_value={"embedding": [1.0, 0.0]})
+    with patch("google.generativeai.embed_content_async", embed):
+        _, vector = await cache.lookup("a")
+        cache.insert(vector, {"response": "A"})
+        later = time.monotonic() + 61
+        with patch("gemini_client.time.monotonic", return_value=later):
+            assert (await cache.lookup("a"))[0] is None
+
+
+@pytest.mark.asyncio
+async def test_semantic_cache_disabled_skips_embedding():
+    cache = SemanticCache(max_size=0, threshold=0.9, ttl=60)
+    embed = AsyncMock()
+    with patch("google.generativeai.embed_content_async", embed):
+        assert await cache.lookup("a") == (None, None)
+    embed.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_generate_response_coalesces_concurrent_calls(
+    deterministic_gemini_client,
+):
+    async def slow_generate(*args, **kwargs):
+        await asyncio.sleep(0.01)
+        return Mock(text="Done", candidates=[])
+
+    model = deterministic_gemini_client.model
+    model.generate_content_async = AsyncMock(side_effect=slow_generate)
+    results = await asyncio.gather(
+        deterministic_gemini_client.generate_response("Test task"),
+        deterministic_gemini_client.generate_response("Test task"),
+    )
+    assert results[0] == results[1]
+    model.generate_content_async.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_coalesced_waiter_survives_owner_cancellation(
+    deterministic_gemini_client,
+):
+    async def slow_generate(*args, **kwargs):
+        await asyncio.sleep(0.05)
+        return Mock(text="Done", candidates=[])
+
+    model = deterministic_gemini_client.model
+    model.generate_content_async = AsyncMock(side_effect=slow_generate)
+    owner = asyncio.create_task(deterministic_gemini_client.generate_response("p"))
+    await asyncio.sleep(0)
+    waiter = asyncio.create_task(deterministic_gemini_client.generate_response("p"))
+    await asyncio.sleep(0.01)
+    owner.cancel()
+
+    result = await waiter
+    assert owner.cancelled()
+    assert result["success"] is True
+    assert model.generate_content_async.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_generate_batch_sends_duplicates_once(deterministic_gemini_client):
+    with patch.object(
+        deterministic_gemini_client, "generate_response"
+    ) as mock_generate:
+        mock_generate.side_effect = lambda prompt, context: {"response": prompt}
+        results = await deterministic_gemini_client.generate_batch(["a", "b", "a"])
+    assert [r["response"] for r in results] == ["a", "b", "a"]
+    assert mock_generate.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_generate_batch_keeps_duplicates_when_sampling(mock_gemini_client):
+    with patch.object(mock_gemini_client, "generate_response") as mock_generate:
+        mock_generate.side_effect = lambda prompt, context: {"response": prompt}
+        results = await mock_gemini_client.generate_batch(["a", "a", "a"])
+    assert [r["response"] for r in results] == ["a", "a", "a"]
+    assert mock_generate.call_count == 3
+
+
+@pytest.mark.asyncio
+async def test_fast_to_thread_propagates_context_vars():
+    request_id = contextvars.ContextVar("request_id")
+    assert await _fast_to_thread(lambda: request_id.get(None)) is None
+    request_id.set("abc")
+    assert await _fast_to_thread(request_id.get) == "abc"
+
+
+def test_generation_config_is_built_once():
+    config = AgentConfig(gemini_api_key="test", gemini_temperature=0.2)
+    with patch("google.generativeai.configure"), patch(
+        "google.generativeai.GenerativeModel"
+    ) as mock_model:
+        GeminiClient(config)
+    generation_config = mock_model.call_args.kwargs["generation_config"]
+    assert generation_config.temperature == 0.2
+    assert generation_config.max_output_tokens == config.gemini_max_tokens
+
+
+def test_get_client_is_shared():
+    get_client.cache_clear()
+    with patch("google.generativeai.configure") as mock_configure:
+        with patch("google.generativeai.GenerativeModel"):
+            assert get_client() is get_client()
+    mock_configure.assert_called_once()
+    get_client.cache_clear()